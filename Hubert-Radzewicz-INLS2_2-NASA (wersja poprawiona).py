@@ -1,9 +1,580 @@
 # Importujemy niezbędne biblioteki
+import time  # Pomiar czasu startu i ładowania paczki (importowany jako pierwszy, aby zmierzyć pozostałe importy)
+_MODULE_START = time.perf_counter()  # Początek importów - punkt odniesienia dla --profile-startup
 import tkinter as tk  # Biblioteka do tworzenia graficznego interfejsu użytkownika (GUI)
 from tkinter import messagebox, scrolledtext, filedialog  # Dodatkowe komponenty GUI (okna dialogowe, przewijane pole tekstowe)
-from PIL import Image, ImageTk, UnidentifiedImageError # Biblioteka Pillow do obsługi obrazów (otwieranie, manipulacja, wyświetlanie)
-import requests  # Biblioteka do wysyłania żądań HTTP (np. do API)
+_TKINTER_IMPORTED = time.perf_counter()
 from io import BytesIO  # Moduł do obsługi strumieni bajtów w pamięci (np. dla danych obrazu)
+import argparse  # Obsługa argumentów wiersza poleceń (np. --pack, --build-pack)
+import contextlib  # Menedżer kontekstu do pomiaru etapów startu
+import hashlib  # Bezpieczne nazwy plików miniatur zapisanej sesji
+import json  # Serializacja indeksu paczek offline i zapisanej sesji
+import mmap  # Mapowanie plików paczek do pamięci (bez kopiowania danych)
+import os  # Operacje na plikach (atomowa podmiana paczki)
+import struct  # Binarny nagłówek paczki
+import tempfile  # Plik tymczasowy na miniatury podczas budowania paczki
+import shutil  # Kopiowanie strumieni plików
+import threading  # Ładowanie ciężkich bibliotek w tle
+
+# Ciężkie biblioteki (requests ciągnie urllib3 i wykrywanie kodowania, Pillow i NumPy swoje
+# rozszerzenia binarne) są ładowane leniwie przez load_heavy_modules(), aby nie opóźniać pierwszej klatki.
+requests = None  # Biblioteka do wysyłania żądań HTTP (np. do API)
+Image = ImageTk = UnidentifiedImageError = None  # Pillow do obsługi obrazów (otwieranie, manipulacja, wyświetlanie)
+np = None  # NumPy - wektorowe obliczenia skrótów percepcyjnych (dHash) i odległości Hamminga
+
+
+# --- Profil startu aplikacji ---
+class StartupProfile:
+    """
+    Zbiera czasy kolejnych etapów startu (importy, budowa widgetów),
+    aby raport --profile-startup pozwalał śledzić regresje zimnego startu.
+    """
+    def __init__(self, start):
+        """
+        Inicjalizuje profil.
+
+        Args:
+            start (float): Moment odniesienia (time.perf_counter()) - początek importów modułu.
+        """
+        self.start = start
+        self.stages = []  # Lista krotek (nazwa etapu, czas trwania w s, wątek)
+        self._lock = threading.Lock()  # Etapy mogą być zapisywane z wątku ładującego biblioteki
+
+    def record(self, label, duration):
+        """
+        Zapisuje czas trwania etapu.
+
+        Args:
+            label (str): Nazwa etapu.
+            duration (float): Czas trwania w sekundach.
+        """
+        thread = "" if threading.current_thread() is threading.main_thread() else "w tle"
+        with self._lock:
+            self.stages.append((label, duration, thread))
+
+    @contextlib.contextmanager
+    def measure(self, label):
+        """Menedżer kontekstu mierzący czas wykonania bloku jako etap o podanej nazwie."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(label, time.perf_counter() - started)
+
+    def report(self):
+        """
+        Formatuje raport z czasami etapów.
+
+        Returns:
+            str: Tabela etapów z czasami w milisekundach i łącznym czasem od początku importów.
+        """
+        lines = ["Profil startu (ms):"]
+        with self._lock:
+            stages = list(self.stages)
+        for label, duration, thread in stages:
+            suffix = f"  [{thread}]" if thread else ""
+            lines.append(f"  {label:<36} {duration * 1000:8.1f}{suffix}")
+        lines.append(f"  {'łącznie od początku importów':<36} {(time.perf_counter() - self.start) * 1000:8.1f}")
+        return "\n".join(lines)
+
+
+STARTUP_PROFILE = StartupProfile(_MODULE_START)
+STARTUP_PROFILE.record("import tkinter", _TKINTER_IMPORTED - _MODULE_START)
+
+_heavy_modules_lock = threading.Lock()
+
+def load_heavy_modules():
+    """
+    Importuje requests, Pillow i NumPy i udostępnia je jako zmienne globalne modułu.
+
+    Wywołanie jest idempotentne i bezpieczne wątkowo: jeśli import trwa właśnie
+    w wątku tła, funkcja czeka na jego zakończenie.
+
+    Raises:
+        ImportError: Jeśli którejś z bibliotek nie da się zaimportować.
+    """
+    global requests, Image, ImageTk, UnidentifiedImageError, np
+    with _heavy_modules_lock:
+        if requests is None:
+            with STARTUP_PROFILE.measure("import requests"):
+                import requests as requests_module
+            requests = requests_module
+        if Image is None:
+            with STARTUP_PROFILE.measure("import PIL (Image, ImageTk)"):
+                from PIL import Image as image_module, ImageTk as imagetk_module, UnidentifiedImageError as pil_error
+            Image, ImageTk, UnidentifiedImageError = image_module, imagetk_module, pil_error
+        if np is None:
+            with STARTUP_PROFILE.measure("import numpy"):
+                import numpy as numpy_module
+            np = numpy_module
+
+def start_background_imports():
+    """
+    Uruchamia ładowanie ciężkich bibliotek w wątku tła.
+
+    Returns:
+        threading.Thread: Wątek ładujący (demon).
+    """
+    def worker():
+        try:
+            load_heavy_modules()
+        except ImportError:
+            pass # Błąd zostanie zgłoszony przy pierwszym użyciu, gdy wywołanie nastąpi w wątku GUI
+    thread = threading.Thread(target=worker, name="heavy-imports", daemon=True)
+    thread.start()
+    return thread
+
+NASA_API_URL = "https://images-api.nasa.gov/search"  # Adres wyszukiwarki API NASA
+# Katalog z ostatnią sesją (zapytanie, metadane i miniatury PNG) przywracaną przy starcie
+SESSION_DIR = os.path.join(os.path.expanduser("~"), ".nasa_image_viewer", "session")
+SESSION_FILE = "session.json"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')  # Rozszerzenia traktowane jako obrazy
+
+# --- Funkcje wspólne dla przeglądarki i budowniczego paczek ---
+def fetch_nasa_images(query, log=None, page=1):
+    """
+    Pobiera dane obrazów z API NASA na podstawie zapytania.
+
+    Args:
+        query (str): Słowo kluczowe do wyszukania w API NASA.
+        log (callable, optional): Funkcja przyjmująca komunikat do zalogowania.
+        page (int, optional): Numer strony wyników (API zwraca do 100 elementów na stronę).
+
+    Returns:
+        dict: Odpowiedź JSON z API jako słownik.
+
+    Raises:
+        requests.exceptions.RequestException: Jeśli wystąpi błąd podczas żądania HTTP (w tym timeout).
+    """
+    load_heavy_modules() # Funkcja bywa wywoływana bez okna (np. przy budowaniu paczki)
+    params = {'q': query, 'media_type': 'image'}
+    if page > 1:
+        params['page'] = page
+    if log:
+        log(f"Wysyłanie żądania do API: {NASA_API_URL} z parametrami: {params}")
+    # Dodano timeout do żądania, aby aplikacja nie zawieszała się na zbyt długo
+    response = requests.get(NASA_API_URL, params=params, timeout=15) # 15 sekund timeout
+    response.raise_for_status()  # Rzuci wyjątkiem dla kodów błędów HTTP (4xx lub 5xx)
+    if log:
+        log(f"Otrzymano odpowiedź od API, status: {response.status_code}")
+    return response.json()
+
+def extract_item_info(item):
+    """
+    Wyciąga z elementu odpowiedzi API identyfikator, tytuł i URL miniatury.
+
+    Args:
+        item (dict): Pojedynczy element z `collection.items` odpowiedzi API.
+
+    Returns:
+        dict: Słownik z kluczami 'nasa_id', 'title' i 'img_url' (pusty napis, jeśli brak obrazu).
+    """
+    links = item.get("links", [])
+    data_info_list = item.get("data", [])
+
+    title = "Bez tytułu"
+    nasa_id = ""
+    if data_info_list:
+        title = data_info_list[0].get("title", "Bez tytułu")
+        nasa_id = data_info_list[0].get("nasa_id", "")
+
+    img_url = ""
+    # Szukamy linku do obrazu (href), który jest typu 'image'
+    if links:
+        for link_info in links:
+            if link_info.get("render") == "image" and link_info.get("href"):
+                img_url = link_info.get("href")
+                break # Znaleziono pierwszy link do obrazu
+        if not img_url and links[0].get("href","").lower().endswith(IMAGE_EXTENSIONS): # Zapasowy, jeśli nie ma 'render'
+            img_url = links[0].get("href")
+
+    # Bez nasa_id używamy URL jako klucza, aby elementy dało się rozróżnić
+    return {'nasa_id': nasa_id or img_url, 'title': title, 'img_url': img_url}
+
+def download_thumbnail(img_url, size):
+    """
+    Pobiera obraz z URL i zmniejsza go do rozmiaru miniatury.
+
+    Args:
+        img_url (str): URL obrazu.
+        size (tuple): Maksymalny rozmiar miniatury (szerokość, wysokość).
+
+    Returns:
+        PIL.Image.Image: Zmniejszony obraz.
+
+    Raises:
+        requests.exceptions.RequestException: Przy błędach sieciowych.
+        UnidentifiedImageError: Gdy format obrazu jest nierozpoznany.
+    """
+    load_heavy_modules()
+    response = requests.get(img_url, timeout=10) # Timeout dla żądania
+    response.raise_for_status() # Rzuci wyjątkiem dla złych statusów HTTP
+    img = Image.open(BytesIO(response.content))
+    img.thumbnail(size, Image.Resampling.LANCZOS)
+    return img
+
+
+# --- Wykrywanie niemal identycznych obrazów (dHash) ---
+DHASH_SIZE = 8  # Obraz zmniejszany do 9x8 pikseli daje 64-bitowy skrót
+
+def dhash_batch(images):
+    """
+    Oblicza 64-bitowe skróty percepcyjne dHash dla listy obrazów.
+
+    Pillow zmniejsza każdy obraz do 9x8 w skali szarości, a porównania
+    sąsiednich pikseli i pakowanie bitów wykonywane są dla całej partii naraz w NumPy.
+
+    Args:
+        images (list[PIL.Image.Image]): Obrazy do zhaszowania.
+
+    Returns:
+        numpy.ndarray: Tablica skrótów (uint64), po jednym na obraz.
+    """
+    load_heavy_modules() # NumPy i Pillow mogą jeszcze nie być załadowane
+    if not images:
+        return np.zeros(0, dtype=np.uint64)
+    pixels = np.stack([
+        np.asarray(img.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BILINEAR))
+        for img in images
+    ])
+    bits = pixels[:, :, 1:] > pixels[:, :, :-1] # Czy piksel jest jaśniejszy od lewego sąsiada
+    packed = np.packbits(bits.reshape(len(images), -1), axis=1) # 64 bity -> 8 bajtów na obraz
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+def group_near_duplicates(hashes, max_distance):
+    """
+    Grupuje skróty, których odległość Hamminga nie przekracza max_distance.
+
+    Każda grupa zaczyna się od pierwszego nieprzypisanego elementu (zachowując
+    kolejność wyników) i zbiera wszystkie pozostałe elementy bliskie temu reprezentantowi.
+
+    Args:
+        hashes (array-like): Skróty dHash (uint64) w kolejności wyników.
+        max_distance (int): Maksymalna liczba różniących się bitów w obrębie grupy.
+
+    Returns:
+        list[list[int]]: Indeksy elementów w grupach; pierwszy indeks to reprezentant.
+    """
+    load_heavy_modules()
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    count = len(hashes)
+    # Macierz odległości Hamminga dla wszystkich par: XOR, a następnie zliczenie ustawionych bitów
+    xor = hashes[:, None] ^ hashes[None, :]
+    distances = np.unpackbits(xor.view(np.uint8).reshape(count, count, 8), axis=-1).sum(axis=-1)
+
+    groups = []
+    assigned = np.zeros(count, dtype=bool)
+    for index in range(count):
+        if assigned[index]:
+            continue
+        members = np.flatnonzero(~assigned & (distances[index] <= max_distance))
+        assigned[members] = True
+        groups.append(members.tolist())
+    return groups
+
+def duplicate_distance_arg(value):
+    """
+    Typ argumentu --dup-distance: liczba całkowita z zakresu od 0 do liczby bitów dHash.
+
+    Args:
+        value (str): Wartość podana w wierszu poleceń.
+
+    Returns:
+        int: Próg odległości Hamminga.
+
+    Raises:
+        argparse.ArgumentTypeError: Jeśli wartość nie jest liczbą z dozwolonego zakresu.
+    """
+    max_distance = DHASH_SIZE * DHASH_SIZE
+    try:
+        distance = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' nie jest liczbą całkowitą")
+    if not 0 <= distance <= max_distance:
+        raise argparse.ArgumentTypeError(f"wartość musi być z zakresu 0-{max_distance}, podano {distance}")
+    return distance
+
+def positive_int_arg(value):
+    """
+    Typ argumentów --pages i --thumb-size: liczba całkowita większa od zera.
+
+    Args:
+        value (str): Wartość podana w wierszu poleceń.
+
+    Returns:
+        int: Podana liczba.
+
+    Raises:
+        argparse.ArgumentTypeError: Jeśli wartość nie jest dodatnią liczbą całkowitą.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' nie jest liczbą całkowitą")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"wartość musi być większa od zera, podano {number}")
+    return number
+
+
+# --- Paczki offline (mission packs) ---
+# Układ pliku (indeks o stałej szerokości, aby otwarcie nie tworzyło obiektów dla każdego elementu):
+#   nagłówek: magic, liczba elementów, długość metadanych JSON, długość kolumny wyszukiwania
+#   metadane JSON: rozmiar miniatur i zapytania użyte do budowy
+#   tabela PACK_ROW dla każdego elementu, czytana wprost z mapowania:
+#     (przesunięcie i długość miniatury, dHash, przesunięcie i długość rekordu tekstowego)
+#   kolumna wyszukiwania: "tytuł\0zapytanie\0..." małymi literami dla każdego elementu (wszystkie zapytania,
+#     które zwróciły element), rozdzielone znakiem nowej linii
+#   sekcja danych: rekordy tekstowe (pola PACK_TEXT_FIELDS rozdzielone znakiem nowej linii) i miniatury JPEG;
+#     przesunięcia w tabeli liczone są od początku tej sekcji
+PACK_MAGIC = b"NASAPCK2"
+PACK_HEADER = struct.Struct("<8sQQQ")
+PACK_ROW = struct.Struct("<QQQQQ")
+PACK_TEXT_FIELDS = ["nasa_id", "title", "img_url", "query"]
+
+def build_mission_pack(queries, pack_path, thumbnail_size=(150, 150), pages=1, log=print):
+    """
+    Buduje paczkę offline: uruchamia zapytania w API NASA, pobiera miniatury
+    i zapisuje wszystko do jednego pliku.
+
+    Args:
+        queries (list[str]): Lista zapytań do wykonania.
+        pack_path (str): Ścieżka docelowego pliku paczki.
+        thumbnail_size (tuple, optional): Rozmiar zapisywanych miniatur.
+        pages (int, optional): Liczba stron wyników pobieranych dla każdego zapytania.
+        log (callable, optional): Funkcja do logowania postępu.
+
+    Returns:
+        int: Liczba elementów zapisanych w paczce.
+    """
+    load_heavy_modules() # Tryb wsadowy nie uruchamia importów w tle
+    rows = []
+    # Te same zdjęcia często pojawiają się w wielu zapytaniach - zapisujemy je raz,
+    # a kolejne zapytania dopisujemy do ich klucza wyszukiwania
+    rows_by_id = {}
+    # Miniatury trafiają najpierw do pliku tymczasowego, bo długość indeksu znamy dopiero na końcu
+    with tempfile.TemporaryFile() as blobs:
+        for query in queries:
+            for page in range(1, pages + 1):
+                try:
+                    data = fetch_nasa_images(query, log=log, page=page)
+                except requests.exceptions.RequestException as e:
+                    log(f"Błąd połączenia z API NASA dla '{query}' (strona {page}): {e}")
+                    break
+                items = data.get("collection", {}).get("items", [])
+                if not items:
+                    break
+                page_rows, page_images = [], []
+                for item in items:
+                    info = extract_item_info(item)
+                    if not info['img_url']:
+                        continue
+                    if info['nasa_id'] in rows_by_id:
+                        row = rows_by_id[info['nasa_id']]
+                        source_query = query.replace("\n", " ").lower()
+                        if source_query not in row['queries']:
+                            row['queries'].append(source_query)
+                        continue
+                    try:
+                        img = download_thumbnail(info['img_url'], thumbnail_size)
+                        if img.mode not in ("RGB", "L"):
+                            img = img.convert("RGB") # JPEG nie obsługuje przezroczystości ani palet
+                        encoded = BytesIO()
+                        img.save(encoded, format="JPEG", quality=85)
+                    except requests.exceptions.RequestException as e:
+                        log(f"Błąd sieciowy (miniatura) {info['img_url']}: {e}")
+                        continue
+                    except UnidentifiedImageError:
+                        log(f"Nie można zidentyfikować formatu obrazu (miniatura): {info['img_url']}")
+                        continue
+                    except Exception as e: # Np. obcięty JPEG (OSError) lub DecompressionBombError - pomijamy element
+                        log(f"Błąd ładowania miniatury {info['img_url']}: {type(e).__name__} - {e}")
+                        continue
+                    # Znaki nowej linii rozdzielają pola rekordu i wpisy kolumny wyszukiwania
+                    texts = [value.replace("\n", " ") for value in (info['nasa_id'], info['title'], info['img_url'], query)]
+                    record_offset = blobs.tell()
+                    blobs.write("\n".join(texts).encode("utf-8"))
+                    offset = blobs.tell()
+                    blobs.write(encoded.getbuffer())
+                    row = {
+                        'title': texts[1].lower(),
+                        'queries': [texts[3].lower()],
+                        'row': [offset, blobs.tell() - offset, 0, record_offset, offset - record_offset],
+                    }
+                    page_rows.append(row)
+                    page_images.append(img)
+                    rows_by_id[info['nasa_id']] = row
+                # Skróty dHash liczone raz dla całej strony i zapisywane w indeksie
+                for row, dhash in zip(page_rows, dhash_batch(page_images)):
+                    row['row'][2] = int(dhash)
+                rows.extend(page_rows)
+            log(f"Zapytanie '{query}': łącznie {len(rows)} elementów w paczce.")
+
+        meta = json.dumps({
+            'thumbnail_size': list(thumbnail_size),
+            'queries': list(queries),
+        }, ensure_ascii=False, separators=(',', ':')).encode("utf-8")
+        # Klucz wyszukiwania: tytuł i wszystkie zapytania, które zwróciły element, rozdzielone znakiem \0
+        search_column = "\n".join("\0".join([row['title']] + row['queries']) for row in rows).encode("utf-8")
+
+        # Zapis do pliku tymczasowego i atomowa podmiana, aby nie zostawić uszkodzonej paczki
+        tmp_path = f"{pack_path}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(PACK_HEADER.pack(PACK_MAGIC, len(rows), len(meta), len(search_column)))
+            out.write(meta)
+            for row in rows:
+                out.write(PACK_ROW.pack(*row['row']))
+            out.write(search_column)
+            blobs.seek(0)
+            shutil.copyfileobj(blobs, out)
+        os.replace(tmp_path, pack_path)
+
+    log(f"Zapisano paczkę {pack_path}: {len(rows)} elementów.")
+    return len(rows)
+
+
+class MissionPack:
+    """
+    Paczka offline zmapowana do pamięci. Miniatury są serwowane bezpośrednio
+    z mapowania jako wycinki memoryview, bez odczytu całego pliku i bez sieci.
+    Otwarcie czyta tylko nagłówek; kolumna wyszukiwania jest dekodowana przy pierwszym wyszukiwaniu,
+    a słowniki elementów powstają wyłącznie dla trafień.
+    """
+    def __init__(self, pack_path):
+        """
+        Otwiera i mapuje paczkę do pamięci, wczytując jedynie nagłówek i metadane.
+
+        Args:
+            pack_path (str): Ścieżka do pliku paczki.
+
+        Raises:
+            ValueError: Jeśli plik nie jest poprawną paczką.
+        """
+        self.path = pack_path
+        self._view = None
+        self._file = open(pack_path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Pusty plik nie może zostać zmapowany
+            self._file.close()
+            raise ValueError(f"Plik {pack_path} nie jest poprawną paczką.")
+        if len(self._mmap) < PACK_HEADER.size:
+            self.close()
+            raise ValueError(f"Plik {pack_path} nie jest poprawną paczką.")
+        magic, count, meta_length, search_length = PACK_HEADER.unpack_from(self._mmap, 0)
+        if magic != PACK_MAGIC:
+            self.close()
+            raise ValueError(f"Plik {pack_path} nie jest poprawną paczką.")
+
+        self._view = memoryview(self._mmap)
+        self.count = count
+        self._table_start = PACK_HEADER.size + meta_length
+        self._search_start = self._table_start + count * PACK_ROW.size
+        self._data_start = self._search_start + search_length
+        try:
+            # Obcięty plik (np. przerwane kopiowanie) - sekcje lub ostatnia miniatura poza końcem pliku
+            if self._data_start > len(self._mmap):
+                raise ValueError("plik jest obcięty")
+            if count:
+                offset, length, _, record_offset, record_length = self._row(count - 1)
+                if self._data_start + max(offset + length, record_offset + record_length) > len(self._mmap):
+                    raise ValueError("plik jest obcięty")
+            meta = json.loads(self._view[PACK_HEADER.size:self._table_start].tobytes())
+            width, height = meta['thumbnail_size']
+            self.thumbnail_size = (int(width), int(height))
+            self.queries = list(meta['queries'])
+        except (ValueError, KeyError, TypeError) as e:
+            self.close()
+            raise ValueError(f"Plik {pack_path} nie jest poprawną paczką: {e}")
+        self._search_keys = None # Klucze "tytuł\0zapytanie\0..." (dekodowane przy pierwszym wyszukiwaniu)
+
+    def __len__(self):
+        return self.count
+
+    def _row(self, index):
+        """Odczytuje wiersz tabeli indeksu: (przesunięcie, długość, dHash, przesunięcie rekordu, długość rekordu)."""
+        return PACK_ROW.unpack_from(self._view, self._table_start + index * PACK_ROW.size)
+
+    def item(self, index):
+        """
+        Buduje słownik elementu o podanym indeksie, czytając tylko jego rekord.
+
+        Args:
+            index (int): Indeks elementu w paczce.
+
+        Returns:
+            dict: Element z kluczami 'nasa_id', 'title', 'img_url', 'query', 'pack_index' i 'dhash'.
+        """
+        _, _, dhash, record_offset, record_length = self._row(index)
+        start = self._data_start + record_offset
+        item = dict(zip(PACK_TEXT_FIELDS, str(self._view[start:start + record_length], "utf-8").split("\n")))
+        item['pack_index'] = index
+        item['dhash'] = dhash
+        return item
+
+    def search(self, query):
+        """
+        Wyszukuje elementy, których tytuł lub zapytania źródłowe zawierają wszystkie słowa zapytania.
+
+        Args:
+            query (str): Zapytanie użytkownika.
+
+        Returns:
+            list[int]: Indeksy pasujących elementów w kolejności z paczki (słowniki buduje `item`).
+        """
+        if self._search_keys is None:
+            # Słowa zapytania nie zawierają znaku \0, więc nie dopasują się na granicy tytułu i zapytań
+            keys = str(self._view[self._search_start:self._data_start], "utf-8")
+            keys = keys.split("\n") if self.count else []
+            if len(keys) != self.count:
+                raise ValueError(f"Uszkodzona kolumna wyszukiwania w paczce {self.path}.")
+            self._search_keys = keys
+        hits = range(self.count)
+        for term in query.lower().split():
+            hits = [index for index in hits if term in self._search_keys[index]]
+        return list(hits)
+
+    def thumbnail_bytes(self, index):
+        """
+        Zwraca zakodowaną miniaturę jako wycinek mapowania (bez kopiowania).
+
+        Args:
+            index (int): Indeks elementu w paczce ('pack_index').
+
+        Returns:
+            memoryview: Bajty miniatury JPEG.
+        """
+        offset, length = self._row(index)[:2]
+        start = self._data_start + offset
+        return self._view[start:start + length]
+
+    def open_thumbnail(self, index):
+        """
+        Dekoduje miniaturę z paczki.
+
+        Args:
+            index (int): Indeks elementu w paczce ('pack_index').
+
+        Returns:
+            PIL.Image.Image: Zdekodowana miniatura.
+        """
+        load_heavy_modules() # Wywołanie możliwe przed zakończeniem importów w tle
+        return Image.open(BytesIO(self.thumbnail_bytes(index)))
+
+    def close(self):
+        """
+        Zwalnia mapowanie i zamyka plik paczki.
+
+        Jeśli wycinki zwrócone przez `thumbnail_bytes` wciąż istnieją, mapowanie nie może zostać
+        zamknięte od razu - system zwolni je po usunięciu ostatniego wycinka.
+        """
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+            self._view = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass # Istniejące wycinki trzymają mapowanie; zostanie zwolnione razem z nimi
+        self._file.close()
 
 # --- Klasa stylu do przechowywania wspólnych ustawień wyglądu ---
 class Style:
@@ -18,8 +589,21 @@ class Style:
         self.FONT_SIZE = 12  # Standardowy rozmiar czcionki
         self.FONT_MAIN = (self.FONT_FAMILY, self.FONT_SIZE)  # Standardowa czcionka ( кортеж )
         self.FONT_BOLD = (self.FONT_FAMILY, self.FONT_SIZE, "bold")  # Pogrubiona czcionka ( кортеж )
-        self.THUMBNAIL_SIZE = (150, 150)  # Rozmiar miniatur obrazów ( кортеж )
-        self.COLUMNS = 7  # Liczba kolumn do wyświetlania miniatur
+        self.THUMBNAIL_SIZE = (150, 150)  # Domyślny rozmiar miniatur obrazów ( кортеж )
+        self.TILE_SIZES = (100, 150, 300)  # Dostępne rozmiary kafelków w pikselach
+        self.HIDPI_SCALE = 2  # Mnożnik rozmiaru kafelków w trybie HiDPI
+        # Największy rozmiar przechowywanego źródła miniatury - wystarcza dla każdego kafelka
+        self.SOURCE_SIZE = (max(self.TILE_SIZES) * self.HIDPI_SCALE,) * 2
+        self.TILE_BORDER = 3  # Ramka i padx etykiety obrazu w kafelku (domyślne w Tk: bd=2, padx=1)
+        self.SCALED_CACHE_SIZE = 3  # Liczba przeskalowanych wersji trzymanych dla każdej miniatury
+        self.MAX_RESULTS = 30  # Maksymalna liczba kafelków w siatce
+        # Liczba zdekodowanych miniatur pamiętanych między wyszukiwaniami - dwie siatki
+        # (źródło 600×600 RGB to ok. 1 MB, więc pamięć podręczna zajmuje ok. 60 MB)
+        self.THUMBNAIL_CACHE_SIZE = 2 * self.MAX_RESULTS
+        self.MAX_CANDIDATES = 100  # Ile wyników przeglądamy, aby zapełnić siatkę różnymi obrazami
+        self.DUPLICATE_MAX_DISTANCE = 6  # Odległość Hamminga (z 64 bitów dHash), poniżej której obrazy są duplikatami
+        self.COLUMNS = 7  # Początkowa liczba kolumn (zanim znana jest szerokość Canvas)
+        self.RESIZE_DEBOUNCE_MS = 100  # Opóźnienie przebudowy siatki podczas zmiany rozmiaru okna
         self.PAD_X = 5  # Padding (dopełnienie) poziomy dla elementów interfejsu
         self.PAD_Y = 5  # Padding (dopełnienie) pionowy dla elementów interfejsu
         # Słownik z standardowymi opcjami 'pack' dla rozszerzania i wypełniania
@@ -69,18 +653,89 @@ class Logger:
         self.log_box.insert(tk.END, f"{message}\n")  # Dodajemy wiadomość na końcu pola tekstowego, z nową linią
         self.log_box.see(tk.END)  # Automatycznie przewijamy do ostatniego wpisu
 
+# --- Kafelek siatki wyników ---
+class Tile:
+    """
+    Pojedynczy kafelek w siatce wyników: widgety, zdekodowane źródło miniatury
+    oraz kilka ostatnio użytych przeskalowanych wersji, dzięki którym zmiana
+    rozmiaru kafelków nie wymaga sieci ani ponownego dekodowania.
+    """
+    def __init__(self, item, source, frame, panel, title_label, badge, dhash=None, max_cached=3):
+        """
+        Inicjalizuje kafelek.
+
+        Args:
+            item (dict): Element wyników z kluczami 'nasa_id', 'title' i 'img_url'.
+            source (PIL.Image.Image or None): Zdekodowana miniatura w największym potrzebnym rozmiarze;
+                None dla kafelków przywróconych z sesji, które tylko wyświetlają zapisany PNG
+                (źródło wczytuje NASAImageViewer._load_thumbnail, gdy trzeba przeskalować kafelek).
+            frame (tk.Frame): Ramka kafelka umieszczana w siatce.
+            panel (tk.Label): Etykieta wyświetlająca obraz.
+            title_label (tk.Label): Etykieta z tytułem.
+            badge (tk.Label): Plakietka z liczbą zgrupowanych duplikatów.
+            dhash (int, optional): Skrót percepcyjny miniatury źródłowej.
+            max_cached (int, optional): Liczba przechowywanych przeskalowanych wersji.
+        """
+        self.item = item
+        self.source = source
+        self.frame = frame
+        self.panel = panel
+        self.title_label = title_label
+        self.badge = badge
+        self.dhash = dhash
+        self.duplicate_count = 1  # Liczba elementów wyników reprezentowanych przez ten kafelek
+        self.max_cached = max_cached
+        self.scaled = {}  # rozmiar -> PIL.Image.Image, w kolejności ostatniego użycia
+        self.photo = None  # Aktualnie wyświetlany ImageTk.PhotoImage (referencja zapobiega GC)
+        self.rendered_size = None  # Rozmiar kafelka, dla którego przygotowano self.photo
+
+    def scaled_image(self, size):
+        """
+        Zwraca miniaturę zmniejszoną do podanego rozmiaru, korzystając z pamięci podręcznej.
+
+        Skalowanie odbywa się od najmniejszej przechowywanej wersji, która jest
+        nie mniejsza niż żądany rozmiar (lub od źródła), co jest tańsze niż skalowanie od źródła.
+
+        Wymaga źródła miniatury (self.source).
+
+        Args:
+            size (int): Maksymalny bok miniatury w pikselach.
+
+        Returns:
+            PIL.Image.Image: Przeskalowany obraz.
+        """
+        if size in self.scaled:
+            img = self.scaled.pop(size)
+            self.scaled[size] = img # Przesunięcie na koniec - ostatnio użyty
+            return img
+
+        base = self.source
+        for cached_size, cached_img in self.scaled.items():
+            if size <= cached_size and cached_img.width * cached_img.height < base.width * base.height:
+                base = cached_img
+        img = base.copy()
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+        self.scaled[size] = img
+        while len(self.scaled) > self.max_cached:
+            del self.scaled[next(iter(self.scaled))] # Usuń najdawniej użytą wersję
+        return img
+
 # --- Główna aplikacja NASA Viewer ---
 class NASAImageViewer:
     """
     Główna klasa aplikacji do przeglądania obrazów z API NASA.
     Odpowiada za inicjalizację interfejsu, obsługę zdarzeń i komunikację z API.
     """
-    def __init__(self, root_window):
+    def __init__(self, root_window, pack_path=None, duplicate_distance=None):
         """
         Inicjalizuje główne okno aplikacji i jego komponenty.
 
         Args:
             root_window (tk.Tk): Główne okno aplikacji Tkinter.
+            pack_path (str, optional): Ścieżka do paczki offline; wyszukiwanie odbywa się wtedy bez sieci.
+            duplicate_distance (int, optional): Próg odległości Hamminga dla grupowania duplikatów
+                (domyślnie Style.DUPLICATE_MAX_DISTANCE).
         """
         self.root = root_window  # Przypisanie głównego okna
         self.root.title("NASA Image Viewer 🌌")  # Ustawienie tytułu okna
@@ -88,12 +743,208 @@ class NASAImageViewer:
         self.root.minsize(800, 500) # Minimalny rozmiar okna
 
         self.style = Style()  # Inicjalizacja obiektu stylu
+        if duplicate_distance is not None:
+            self.style.DUPLICATE_MAX_DISTANCE = duplicate_distance
         self.root.configure(bg=self.style.BG_COLOR)  # Ustawiamy kolor tła głównego okna
 
         self.image_references = [] # Lista do przechowywania referencji do obrazów Tkinter (zapobiega GC)
+        self.tiles = {} # Kafelki (Tile) aktualnie wyświetlane w siatce: nasa_id -> Tile, w kolejności wyników
+        # Ostatnio zdekodowane miniatury wraz ze skrótami: nasa_id -> {'image': PIL.Image.Image, 'dhash': int lub None} (LRU)
+        self.thumbnail_cache = {}
+        self.results_label = None # Etykieta "Wyniki dla: ..." (tworzona przy pierwszym wyszukiwaniu)
+        self.status_label = None # Etykieta z komunikatem zamiast wyników (np. "Brak wyników.")
+        self.columns = self.style.COLUMNS # Bieżąca liczba kolumn siatki
+        self.tile_size = tk.IntVar(value=self.style.THUMBNAIL_SIZE[0]) # Wybrany rozmiar kafelka
+        self.hidpi = tk.BooleanVar(value=False) # Tryb HiDPI (podwojony rozmiar kafelków)
+        self._reflow_job = None # Identyfikator zaplanowanej przebudowy siatki (root.after)
+        self.last_query = None # Zapytanie, którego wyniki są wyświetlane (zapisywane w sesji)
+        self.background_imports = None # Wątek ładujący ciężkie biblioteki (tworzony w setup_layout)
 
         self.setup_layout()  # Wywołanie metody budującej interfejs użytkownika
 
+        self.mission_pack = None # Paczka offline (MissionPack), jeśli podano
+        if pack_path:
+            with STARTUP_PROFILE.measure("paczka offline"):
+                self._open_mission_pack(pack_path)
+
+        with STARTUP_PROFILE.measure("przywrócenie sesji"):
+            self._restore_session()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close) # Zapis sesji przy zamykaniu okna
+
+    def _restore_session(self):
+        """
+        Odtwarza siatkę ostatniej sesji z lokalnej pamięci podręcznej.
+
+        Miniatury są zapisane jako PNG, które Tk wczytuje natywnie, więc przywrócenie
+        nie wymaga ani sieci, ani Pillow - może nastąpić, zanim ciężkie biblioteki się załadują.
+        PNG służą tylko do wyświetlenia w zapisanym rozmiarze; przy zmianie rozmiaru lub haszowaniu
+        kafelek wczytuje prawdziwe źródło przez _load_thumbnail.
+        """
+        try:
+            with open(os.path.join(SESSION_DIR, SESSION_FILE), encoding="utf-8") as f:
+                session = json.load(f)
+            self._validate_session(session)
+        except FileNotFoundError:
+            return # Pierwsze uruchomienie - brak zapisanej sesji
+        except (OSError, ValueError) as e: # Także plik z innej wersji programu lub edytowany ręcznie
+            self.logger.log(f"Nie udało się wczytać zapisanej sesji: {e}")
+            return
+
+        query = session.get('query') or ""
+        self.tile_size.set(session.get('tile_size', self.style.THUMBNAIL_SIZE[0]))
+        self.hidpi.set(session.get('hidpi', False))
+        saved_size = self._effective_tile_size() # Rozmiar, w którym zapisano miniatury PNG
+        self._limit_tile_size_to_pack() # Zapisany rozmiar mógł przekraczać rozdzielczość otwartej paczki
+        # Indeksy elementów są ważne tylko dla tej samej paczki, z której pochodziła sesja
+        same_pack = self.mission_pack is not None and session.get('pack') == os.path.abspath(self.mission_pack.path)
+        self.entry.insert(0, query)
+        self._show_results_header(f"Wyniki dla: '{query}' (zapisana sesja)")
+
+        for entry in session.get('items', []):
+            thumbnail_path = os.path.join(SESSION_DIR, entry['thumbnail'])
+            try:
+                photo = tk.PhotoImage(file=thumbnail_path)
+            except tk.TclError: # Brakujący lub uszkodzony plik miniatury
+                continue
+            item = {'nasa_id': entry['nasa_id'], 'title': entry['title'], 'img_url': entry['img_url']}
+            if same_pack and entry.get('pack_index') is not None and 0 <= entry['pack_index'] < len(self.mission_pack):
+                item['pack_index'] = entry['pack_index']
+            tile = self._create_tile(item, None, entry.get('dhash'), photo=photo, photo_size=saved_size)
+            self._set_duplicate_count(tile, entry.get('duplicate_count') or 1)
+            self.tiles[item['nasa_id']] = tile
+
+        self.last_query = query
+        self._layout_tiles()
+        self.logger.log(f"Przywrócono sesję '{query}': {len(self.tiles)} kafelków.")
+        if saved_size != self._effective_tile_size():
+            self.root.after_idle(self._apply_tile_size) # Rozmiar ograniczony przez paczkę - przeskalowanie ze źródeł
+
+    def _validate_session(self, session):
+        """
+        Sprawdza strukturę wczytanego pliku sesji, zanim cokolwiek zostanie z niego odtworzone.
+
+        Args:
+            session: Zawartość pliku sesji po json.load.
+
+        Raises:
+            ValueError: Jeśli plik nie ma oczekiwanej struktury.
+        """
+        def check(condition, message):
+            if not condition:
+                raise ValueError(f"niepoprawny plik sesji: {message}")
+
+        def optional(value, kind):
+            return value is None or (isinstance(value, kind) and not isinstance(value, bool))
+
+        check(isinstance(session, dict), "oczekiwano obiektu JSON")
+        check(optional(session.get('query'), str), "'query' nie jest tekstem")
+        check(session.get('tile_size', self.style.THUMBNAIL_SIZE[0]) in self.style.TILE_SIZES,
+              f"'tile_size' spoza {self.style.TILE_SIZES}")
+        check(isinstance(session.get('hidpi', False), bool), "'hidpi' nie jest wartością logiczną")
+        check(optional(session.get('pack'), str), "'pack' nie jest ścieżką")
+        check(isinstance(session.get('items', []), list), "'items' nie jest listą")
+        for entry in session.get('items', []):
+            check(isinstance(entry, dict), "element 'items' nie jest obiektem")
+            for key in ('nasa_id', 'title', 'img_url', 'thumbnail'):
+                check(isinstance(entry.get(key), str), f"brak pola '{key}' w elemencie")
+            # Miniatury leżą wyłącznie w katalogu sesji
+            check(os.path.basename(entry['thumbnail']) == entry['thumbnail'], "niepoprawna nazwa pliku miniatury")
+            check(optional(entry.get('dhash'), int) and 0 <= (entry.get('dhash') or 0) < 2 ** 64,
+                  "'dhash' nie jest 64-bitowym skrótem")
+            check(optional(entry.get('pack_index'), int), "'pack_index' nie jest liczbą")
+            check(optional(entry.get('duplicate_count'), int) and (entry.get('duplicate_count') or 1) >= 1,
+                  "'duplicate_count' nie jest liczbą dodatnią")
+
+    def _save_session(self):
+        """
+        Zapisuje bieżące wyniki do katalogu sesji: metadane w JSON i miniatury
+        w aktualnym rozmiarze kafelków jako PNG. Nieużywane pliki miniatur są usuwane.
+
+        Kafelki przywrócone z sesji bez wczytanego źródła zachowują swój PNG tylko wtedy,
+        gdy pasuje do bieżącego rozmiaru - mniejszy obraz nie jest zapisywany pod większym rozmiarem.
+        """
+        if self.last_query is None:
+            return
+        load_heavy_modules()
+        os.makedirs(SESSION_DIR, exist_ok=True)
+
+        size = self._effective_tile_size()
+        entries = []
+        keep = {SESSION_FILE}
+        for nasa_id, tile in self.tiles.items():
+            filename = f"{hashlib.sha1(nasa_id.encode('utf-8')).hexdigest()}_{size}.png"
+            path = os.path.join(SESSION_DIR, filename)
+            if not os.path.exists(path): # Miniatura mogła zostać zapisana w poprzedniej sesji
+                if tile.source is None:
+                    continue # Brak źródła w tym rozmiarze (np. nie udało się go wczytać) - pomijamy kafelek
+                img = tile.scaled_image(size)
+                if img.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+                    img = img.convert("RGB") # PNG nie obsługuje np. CMYK
+                img.save(path, format="PNG")
+            keep.add(filename)
+            entries.append({
+                'nasa_id': nasa_id,
+                'title': tile.item['title'],
+                'img_url': tile.item['img_url'],
+                'dhash': tile.dhash,
+                'duplicate_count': tile.duplicate_count,
+                'thumbnail': filename,
+                'pack_index': tile.item.get('pack_index'),
+            })
+
+        session = {
+            'query': self.last_query,
+            'pack': os.path.abspath(self.mission_pack.path) if self.mission_pack is not None else None,
+            'tile_size': self.tile_size.get(),
+            'hidpi': self.hidpi.get(),
+            'items': entries,
+        }
+        tmp_path = os.path.join(SESSION_DIR, f"{SESSION_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(SESSION_DIR, SESSION_FILE))
+
+        for filename in os.listdir(SESSION_DIR):
+            if filename not in keep:
+                os.remove(os.path.join(SESSION_DIR, filename))
+
+    def _on_close(self):
+        """Zapisuje sesję i zamyka okno aplikacji."""
+        try:
+            self._save_session()
+        except (OSError, ImportError, ValueError):
+            pass # Nieudany zapis sesji nie może blokować zamknięcia aplikacji
+        self.root.destroy()
+
+    def report_startup_profile(self):
+        """
+        Czeka na zakończenie importów w tle, wypisuje raport startu na standardowe wyjście
+        i zamyka aplikację (tryb --profile-startup).
+        """
+        if self.background_imports is not None and self.background_imports.is_alive():
+            self.root.after(20, self.report_startup_profile)
+            return
+        print(STARTUP_PROFILE.report())
+        self.root.destroy()
+
+    def _open_mission_pack(self, pack_path):
+        """
+        Mapuje paczkę offline do pamięci i loguje czas ładowania.
+
+        Args:
+            pack_path (str): Ścieżka do pliku paczki.
+        """
+        start = time.perf_counter()
+        try:
+            self.mission_pack = MissionPack(pack_path)
+        except (OSError, ValueError) as e:
+            self.logger.log(f"Nie udało się otworzyć paczki offline: {e}")
+            messagebox.showerror("Błąd paczki", f"Nie udało się otworzyć paczki offline: {e}", parent=self.root)
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.logger.log(f"Załadowano paczkę offline: {len(self.mission_pack)} elementów ({elapsed_ms:.0f} ms).")
+        self._limit_tile_size_to_pack()
+
     # --- Metody pomocnicze do tworzenia stylizowanych widgetów ---
     def _create_styled_frame(self, parent, **kwargs):
         """
@@ -190,7 +1041,34 @@ class NASAImageViewer:
         """
         Konfiguruje układ głównych komponentów interfejsu użytkownika.
         Dzieli okno na sekcję wyszukiwania, sekcję wyników i sekcję logów.
-        Wykorzystuje metody pomocnicze do tworzenia stylizowanych widgetów.
+
+        Pasek wyszukiwania jest budowany i wyświetlany jako pierwszy; ciężkie biblioteki
+        ładują się w tle, a w tym czasie powstaje reszta okna.
+        """
+        with STARTUP_PROFILE.measure("pasek wyszukiwania"):
+            self._build_search_bar()
+        with STARTUP_PROFILE.measure("pierwsza klatka"):
+            self.root.update() # Wyświetlenie okna z paskiem wyszukiwania przed budową reszty interfejsu
+        STARTUP_PROFILE.record("pierwsza klatka (od początku importów)", time.perf_counter() - STARTUP_PROFILE.start)
+
+        self.background_imports = start_background_imports()
+
+        with STARTUP_PROFILE.measure("siatka wyników i logi"):
+            self._build_results_area()
+        # Kontrolki paska działają na siatce i logach, więc włączamy je dopiero teraz
+        for widget in (self.search_btn, self.size_menu, self.hidpi_check):
+            widget.configure(state=tk.NORMAL)
+        # Powiązanie naciśnięcia klawisza Enter w głównym oknie z funkcją wyszukiwania
+        # Działa, gdy focus jest na dowolnym elemencie w głównym oknie, który nie przechwytuje Entera inaczej.
+        # Wiązanie dopiero teraz, bo wyszukiwanie potrzebuje siatki wyników.
+        self.root.bind('<Return>', self.search_images)
+
+    def _build_search_bar(self):
+        """
+        Tworzy pasek wyszukiwania z polem zapytania, przyciskiem i wyborem rozmiaru kafelków.
+
+        Przycisk i wybór rozmiaru są początkowo wyłączone - pierwsza klatka jest wyświetlana,
+        zanim powstaną siatka wyników i logger (włącza je setup_layout).
         """
         # --- Pasek wyszukiwania na górze okna ---
         top_frame = self._create_styled_frame(self.root)
@@ -202,12 +1080,26 @@ class NASAImageViewer:
         self.entry.focus_set() # Ustawienie focusu na pole wprowadzania
 
         # Przycisk wyszukiwania, używając metody pomocniczej
-        search_btn = self._create_styled_button(top_frame, text="Szukaj 🚀", command=self.search_images)
-        search_btn.pack(side=tk.LEFT)
-        # Powiązanie naciśnięcia klawisza Enter w głównym oknie z funkcją wyszukiwania
-        # Działa, gdy focus jest na dowolnym elemencie w głównym oknie, który nie przechwytuje Entera inaczej.
-        self.root.bind('<Return>', self.search_images)
-
+        self.search_btn = self._create_styled_button(top_frame, text="Szukaj 🚀", command=self.search_images, state=tk.DISABLED)
+        self.search_btn.pack(side=tk.LEFT)
+
+        # Wybór rozmiaru kafelków - zmiana nie wymaga ponownego wyszukiwania
+        self.size_menu = tk.OptionMenu(top_frame, self.tile_size, *self.style.TILE_SIZES, command=lambda _: self._apply_tile_size())
+        self.size_menu.configure(bg=self.style.BUTTON_BG_COLOR, fg=self.style.FG_COLOR, font=self.style.FONT_MAIN,
+                                 activebackground=self.style.BUTTON_ACTIVE_BG_COLOR, activeforeground=self.style.FG_COLOR,
+                                 highlightthickness=0, bd=1, state=tk.DISABLED)
+        self.size_menu["menu"].configure(bg=self.style.BUTTON_BG_COLOR, fg=self.style.FG_COLOR)
+        self.size_menu.pack(side=tk.LEFT, padx=(self.style.PAD_X, 0))
+
+        self.hidpi_check = tk.Checkbutton(top_frame, text=f"HiDPI {self.style.HIDPI_SCALE}×", variable=self.hidpi,
+                                          command=self._apply_tile_size, bg=self.style.BG_COLOR, fg=self.style.FG_COLOR,
+                                          selectcolor=self.style.BUTTON_BG_COLOR, activebackground=self.style.BG_COLOR,
+                                          activeforeground=self.style.FG_COLOR, font=self.style.FONT_MAIN,
+                                          state=tk.DISABLED)
+        self.hidpi_check.pack(side=tk.LEFT, padx=(self.style.PAD_X, 0))
+
+    def _build_results_area(self):
+        """Tworzy przewijaną siatkę wyników oraz panel logów."""
         # --- Główna ramka z podziałem na wyniki i logi ---
         main_frame = self._create_styled_frame(self.root)
         main_frame.pack(**self.style.EXPAND_FILL)
@@ -232,6 +1124,8 @@ class NASAImageViewer:
 
         # Konfiguracja Canvas, aby region przewijania dopasowywał się do rozmiaru scrollable_frame
         self.scrollable_frame.bind("<Configure>", self._on_scrollable_frame_configure)
+        # Zmiana szerokości Canvas przebudowuje siatkę (liczbę kolumn)
+        self.canvas.bind("<Configure>", self._on_canvas_configure)
         # Powiązanie kółka myszy z przewijaniem Canvas
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel) # Dla Windows i macOS
         self.canvas.bind_all("<Button-4>", self._on_mousewheel) # Dla Linux (scroll up)
@@ -261,6 +1155,284 @@ class NASAImageViewer:
         # Zapobiega to horyzontalnemu przewijaniu, jeśli nie jest potrzebne.
         self.canvas.itemconfig(self.canvas_window, width=self.canvas.winfo_width())
 
+    def _on_canvas_configure(self, event):
+        """
+        Planuje przebudowę siatki po zmianie rozmiaru Canvas.
+
+        Podczas przeciągania krawędzi okna Tk generuje lawinę zdarzeń <Configure>;
+        każde kolejne zdarzenie przesuwa zaplanowaną przebudowę, więc wykonywana jest tylko jedna.
+        """
+        if self._reflow_job is not None:
+            self.root.after_cancel(self._reflow_job)
+        self._reflow_job = self.root.after(self.style.RESIZE_DEBOUNCE_MS, self._reflow_grid)
+
+    def _reflow_grid(self):
+        """Dopasowuje szerokość zawartości i liczbę kolumn do aktualnej szerokości Canvas."""
+        self._reflow_job = None
+        self.canvas.itemconfig(self.canvas_window, width=self.canvas.winfo_width())
+        if self._columns_for_width(self.canvas.winfo_width()) != self.columns:
+            self._layout_tiles()
+
+    def _effective_tile_size(self):
+        """Zwraca rozmiar kafelka w pikselach z uwzględnieniem trybu HiDPI."""
+        return self.tile_size.get() * (self.style.HIDPI_SCALE if self.hidpi.get() else 1)
+
+    def _columns_for_width(self, width):
+        """
+        Oblicza, ile kafelków zmieści się w wierszu o podanej szerokości.
+
+        Args:
+            width (int): Dostępna szerokość w pikselach.
+
+        Returns:
+            int: Liczba kolumn (co najmniej 1).
+        """
+        if width <= 1: # Canvas jeszcze nie został wyświetlony
+            return self.style.COLUMNS
+        return max(1, width // self._tile_footprint())
+
+    def _tile_footprint(self):
+        """
+        Zwraca szerokość, jaką kafelek zajmuje w siatce (wraz z marginesami).
+
+        Używana jest rzeczywista wymagana szerokość najszerszego kafelka - obejmuje ramkę i padx
+        etykiety obrazu oraz tytuły z wyrazami dłuższymi niż zawijanie. Bez kafelków szerokość jest szacowana.
+
+        Returns:
+            int: Szerokość w pikselach.
+        """
+        if self.tiles:
+            self.scrollable_frame.update_idletasks() # Wymagane rozmiary po ostatniej zmianie obrazów
+            width = max(tile.frame.winfo_reqwidth() for tile in self.tiles.values())
+        else:
+            width = self._effective_tile_size() + 2 * self.style.TILE_BORDER
+        return width + 2 * self.style.PAD_X
+
+    def _show_results_header(self, text):
+        """
+        Ustawia tekst etykiety nad wynikami, tworząc ją przy pierwszym użyciu.
+
+        Args:
+            text (str): Tekst nagłówka.
+        """
+        if self.results_label is None:
+            self.results_label = self._create_styled_label(
+                self.scrollable_frame,
+                text=text,
+                font=(self.style.FONT_FAMILY, 14, "bold")
+            )
+            # Umieszczenie etykiety w siatce, rozciągając na wszystkie kolumny
+            self.results_label.grid(row=0, column=0, columnspan=self.columns, pady=self.style.PAD_Y, padx=self.style.PAD_X, sticky="w")
+        else:
+            self.results_label.configure(text=text)
+
+    def _show_status(self, text):
+        """
+        Wyświetla komunikat zamiast wyników (np. "Brak wyników.") lub go ukrywa.
+
+        Args:
+            text (str or None): Treść komunikatu; None ukrywa etykietę.
+        """
+        if self.status_label is not None:
+            self.status_label.destroy()
+            self.status_label = None
+        if text:
+            self.status_label = self._create_styled_label(self.scrollable_frame, text=text)
+            self.status_label.grid(row=1, column=0, columnspan=self.columns, pady=self.style.PAD_Y)
+
+    def _layout_tiles(self):
+        """Rozmieszcza kafelki w siatce zgodnie z bieżącą liczbą kolumn."""
+        self.columns = self._columns_for_width(self.canvas.winfo_width())
+        if self.results_label is not None:
+            self.results_label.grid_configure(columnspan=self.columns) # Etykieta "Wyniki" nad całą szerokością
+        for index, tile in enumerate(self.tiles.values()):
+            # Wiersz 0 jest zajęty przez etykietę "Wyniki:"
+            tile.frame.grid(row=1 + index // self.columns, column=index % self.columns,
+                            padx=self.style.PAD_X, pady=self.style.PAD_Y, sticky="n")
+
+    def _render_tile(self, tile):
+        """
+        Ustawia w kafelku obraz i zawijanie tytułu dla bieżącego rozmiaru kafelków.
+
+        Args:
+            tile (Tile): Kafelek do odświeżenia.
+        """
+        size = self._effective_tile_size()
+        if tile.rendered_size != size:
+            if tile.source is None:
+                # Kafelek z sesji wyświetla tylko zapisany PNG - do przeskalowania potrzebne jest prawdziwe źródło
+                try:
+                    tile.source = self._load_thumbnail(tile.item)['image']
+                except Exception as e:
+                    self.logger.log(f"Nie udało się wczytać miniatury '{tile.item['title']}': {type(e).__name__} - {e}")
+                    return # Kafelek zachowuje dotychczasowy obraz
+            tile.photo = ImageTk.PhotoImage(tile.scaled_image(size))
+            tile.panel.configure(image=tile.photo)
+            tile.rendered_size = size
+        tile.title_label.configure(wraplength=size - 10) # Zawijanie tekstu do szerokości kafelka
+
+    def _limit_tile_size_to_pack(self):
+        """
+        W trybie offline ogranicza wybór rozmiaru kafelków do rozdzielczości miniatur zapisanych w paczce.
+
+        Pillow nie powiększa miniatur, więc większe kafelki pokazywałyby obrazy w rozmiarze z paczki.
+        Niedostępne rozmiary są wyłączane w menu, a HiDPI - gdy przekroczyłby rozdzielczość paczki.
+        """
+        if self.mission_pack is None:
+            return
+        limit = min(self.mission_pack.thumbnail_size)
+        allowed = [size for size in self.style.TILE_SIZES if size <= limit] or [min(self.style.TILE_SIZES)]
+        menu = self.size_menu["menu"]
+        for position, size in enumerate(self.style.TILE_SIZES):
+            menu.entryconfigure(position, state=tk.NORMAL if size in allowed else tk.DISABLED)
+        if self.tile_size.get() not in allowed:
+            self.logger.log(f"Paczka zawiera miniatury {limit} px - rozmiar kafelków ograniczony do {allowed[-1]} px.")
+            self.tile_size.set(allowed[-1])
+
+        hidpi_allowed = self.tile_size.get() * self.style.HIDPI_SCALE <= limit
+        if not hidpi_allowed:
+            self.hidpi.set(False)
+        self.hidpi_check.configure(state=tk.NORMAL if hidpi_allowed else tk.DISABLED)
+
+    def _apply_tile_size(self):
+        """Przeskalowuje wszystkie kafelki z pamięci podręcznej i przebudowuje siatkę."""
+        load_heavy_modules() # Skalowanie wymaga Pillow (zwykle już załadowanego w tle)
+        self._limit_tile_size_to_pack()
+        for tile in self.tiles.values():
+            self._render_tile(tile)
+        self._layout_tiles()
+        self.logger.log(f"Rozmiar kafelków: {self._effective_tile_size()} px, kolumn: {self.columns}.")
+
+    def _create_tile(self, item, source, dhash=None, photo=None, photo_size=None):
+        """
+        Tworzy widgety kafelka dla elementu wyników (bez umieszczania go w siatce).
+
+        Args:
+            item (dict): Element wyników z kluczami 'nasa_id', 'title' i 'img_url'.
+            source (PIL.Image.Image or None): Zdekodowana miniatura źródłowa (None dla kafelków z sesji).
+            dhash (int, optional): Skrót percepcyjny miniatury.
+            photo (tk.PhotoImage, optional): Gotowy obraz do wyświetlenia (kafelki z sesji, bez Pillow).
+            photo_size (int, optional): Rozmiar kafelka, w którym przygotowano `photo`.
+
+        Returns:
+            Tile: Nowy kafelek.
+        """
+        title = item['title']
+        # Kontener dla obrazka i tytułu, aby były razem i miały tło
+        item_frame = self._create_styled_frame(self.scrollable_frame)
+
+        panel = tk.Label(item_frame, bg=self.style.BG_COLOR, cursor="hand2")
+        panel.pack()
+
+        title_label = self._create_styled_label(
+            item_frame,
+            text=title,
+            font=(self.style.FONT_FAMILY, 10) # Mniejsza czcionka dla tytułu
+        )
+        title_label.pack(pady=(2,0))
+
+        # Plakietka z liczbą zgrupowanych duplikatów, wyświetlana w rogu obrazu (patrz _set_duplicate_count)
+        badge = tk.Label(item_frame, bg=self.style.BUTTON_ACTIVE_BG_COLOR, fg=self.style.FG_COLOR,
+                         font=(self.style.FONT_FAMILY, 9, "bold"), padx=3, pady=0)
+
+        tile = Tile(item, source, item_frame, panel, title_label, badge, dhash=dhash,
+                    max_cached=self.style.SCALED_CACHE_SIZE)
+
+        # Pobranie oryginalnego URL obrazu o lepszej jakości, jeśli dostępny
+        # NASA API często dostarcza link do pliku JSON z metadanymi, skąd można wziąć 'orig'
+        # Dla uproszczenia, używamy img_url, który jest już miniaturą lub obrazem z 'links'
+        # W bardziej zaawansowanej wersji, można by tu pobrać `collection.json` i szukać linku "orig"
+        # Element jest odczytywany z kafelka w chwili kliknięcia - ponownie użyty kafelek dostaje element
+        # z nowych wyników (np. z 'pack_index' paczki offline, z której obraz jest wtedy wczytywany)
+        panel.bind("<Button-1>", lambda e: self.show_full_image(tile.item['img_url'], tile.item['title'], tile.item.get('pack_index')))
+        panel.bind("<Button-3>", lambda e: self.save_image_prompt(tile.item['img_url'], tile.item['title'], tile.item.get('pack_index')))
+        panel.bind("<Button-2>", lambda e: self.save_image_prompt(tile.item['img_url'], tile.item['title'], tile.item.get('pack_index'))) # Dla macOS
+        if photo is not None:
+            tile.photo = photo
+            tile.rendered_size = photo_size
+            panel.configure(image=photo)
+            title_label.configure(wraplength=self._effective_tile_size() - 10)
+        else:
+            self._render_tile(tile)
+        return tile
+
+    def _set_duplicate_count(self, tile, count):
+        """
+        Pokazuje na kafelku plakietkę z liczbą zgrupowanych obrazów (lub ją ukrywa dla pojedynczego).
+
+        Args:
+            tile (Tile): Kafelek reprezentujący grupę.
+            count (int): Liczba elementów wyników w grupie.
+        """
+        tile.duplicate_count = count
+        if count > 1:
+            tile.badge.configure(text=f"×{count}")
+            tile.badge.place(in_=tile.panel, relx=1.0, rely=0.0, anchor="ne", x=-2, y=2)
+        else:
+            tile.badge.place_forget()
+
+    def _collect_candidates(self, pending, count, previous_tiles, seen_ids):
+        """
+        Pobiera z iteratora wyników kolejne elementy z miniaturami, aż zbierze ich `count`.
+
+        Miniatury elementów, które już mają kafelek, są brane z kafelka bez żadnej pracy
+        (kafelek z sesji wnosi tylko skrót - jego PNG nie jest źródłem);
+        pozostałe pochodzą z pamięci podręcznej, paczki offline lub sieci.
+
+        Args:
+            pending (iterator): Iterator par (indeks, element wyników).
+            count (int): Liczba potrzebnych kandydatów.
+            previous_tiles (dict): Kafelki poprzedniego wyszukiwania (nasa_id -> Tile).
+            seen_ids (set): Identyfikatory już rozpatrzone w tym wyszukiwaniu (uzupełniany).
+
+        Returns:
+            list[dict]: Kandydaci z kluczami 'item' i 'thumb' ({'image', 'dhash'});
+            'image' jest None dla kafelka z sesji, który ma już skrót.
+        """
+        batch = []
+        for item_index, item in pending:
+            title = item['title']
+            img_url = item['img_url']
+            nasa_id = item['nasa_id']
+
+            if nasa_id in seen_ids:
+                continue
+            seen_ids.add(nasa_id)
+
+            tile = previous_tiles.get(nasa_id)
+            if tile is not None and (tile.source is not None or tile.dhash is not None):
+                batch.append({'item': item, 'thumb': {'image': tile.source, 'dhash': tile.dhash}})
+            elif img_url:
+                try:
+                    batch.append({'item': item, 'thumb': self._load_thumbnail(item)})
+                except requests.exceptions.Timeout:
+                    self.logger.log(f"Timeout podczas ładowania miniatury: {img_url}")
+                except requests.exceptions.RequestException as e:
+                    self.logger.log(f"Błąd sieciowy (miniatura) {img_url}: {e}")
+                except UnidentifiedImageError:
+                    self.logger.log(f"Nie można zidentyfikować formatu obrazu (miniatura): {img_url}")
+                except Exception as e:
+                    self.logger.log(f"Błąd ładowania miniatury {img_url}: {type(e).__name__} - {e}")
+            else:
+                self.logger.log(f"Brak URL obrazu w elemencie {item_index} dla '{title}'.")
+
+            if len(batch) >= count:
+                break
+        return batch
+
+    def _ensure_hashes(self, candidates):
+        """
+        Uzupełnia brakujące skróty dHash kandydatów jednym wektorowym wywołaniem.
+
+        Skróty trafiają do wpisów pamięci podręcznej miniatur, więc każdy obraz jest haszowany tylko raz.
+
+        Args:
+            candidates (list[dict]): Kandydaci zwróceni przez _collect_candidates.
+        """
+        missing = [c['thumb'] for c in candidates if c['thumb']['dhash'] is None]
+        for thumb, dhash in zip(missing, dhash_batch([thumb['image'] for thumb in missing])):
+            thumb['dhash'] = int(dhash)
+
 
     def _on_mousewheel(self, event):
         """Obsługuje przewijanie kółkiem myszy na Canvas."""
@@ -280,119 +1452,84 @@ class NASAImageViewer:
             self.logger.log("Próba wyszukiwania bez zapytania.")
             return
 
+        try:
+            load_heavy_modules() # Zwykle już załadowane w tle; w przeciwnym razie czekamy na wątek
+        except ImportError as e:
+            self.logger.log(f"Brak wymaganej biblioteki: {e}")
+            messagebox.showerror("Błąd krytyczny", f"Brak wymaganej biblioteki: {e}", parent=self.root)
+            return
+
         self.logger.log(f"Rozpoczynam wyszukiwanie dla: '{query}'")
         self.image_references.clear() # Czyścimy referencje przed nowym wyszukiwaniem
+        previous_tiles = None # Ustawiane po udanym pobraniu wyników; przy błędzie siatka zostaje bez zmian
 
-        # Czyszczenie poprzednich wyników z scrollable_frame
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
+        try:
+            if self.mission_pack is not None:
+                # Wyszukiwanie w paczce offline, bez dostępu do sieci; słowniki tylko dla rozpatrywanych trafień
+                hits = self.mission_pack.search(query)
+                items = [self.mission_pack.item(index) for index in hits[:self.style.MAX_CANDIDATES]]
+                total_count = len(hits)
+            else:
+                # Pobieranie danych z API NASA
+                data = self.fetch_nasa_images(query)
+                items = [extract_item_info(item) for item in data.get("collection", {}).get("items", [])]
+                total_count = len(items)
 
-        # Etykieta "Wyniki:" nad miniaturami
-        results_label = self._create_styled_label(
-            self.scrollable_frame,
-            text=f"Wyniki dla: '{query}'", # Wyświetlenie zapytania w tytule wyników
-            font=(self.style.FONT_FAMILY, 14, "bold")
-        )
-        # Umieszczenie etykiety w siatce, rozciągając na wszystkie kolumny
-        results_label.grid(row=0, column=0, columnspan=self.style.COLUMNS, pady=self.style.PAD_Y, padx=self.style.PAD_X, sticky="w")
+            # Etykieta "Wyniki:" nad miniaturami - tworzona raz, przy kolejnych wyszukiwaniach zmienia się tylko tekst
+            self._show_results_header(f"Wyniki dla: '{query}'") # Wyświetlenie zapytania w tytule wyników
+            self.last_query = query
+            self._show_status(None)
 
-        try:
-            # Pobieranie danych z API NASA
-            data = self.fetch_nasa_images(query)
-            items = data.get("collection", {}).get("items", [])
+            # Kafelki poprzedniego wyszukiwania, kluczowane nasa_id - pasujące zostaną użyte ponownie
+            previous_tiles = self.tiles
+            self.tiles = {}
 
             if not items:
                 self.logger.log(f"Brak wyników dla zapytania: '{query}'.")
-                no_results_label = self._create_styled_label(self.scrollable_frame, text="Brak wyników.")
-                no_results_label.grid(row=1, column=0, columnspan=self.style.COLUMNS, pady=self.style.PAD_Y)
+                self._show_status("Brak wyników.")
                 return
 
-            self.logger.log(f"Znaleziono {len(items)} elementów. Wyświetlam do 30.")
-            row, col = 1, 0 # Zaczynamy od wiersza 1 (wiersz 0 jest dla etykiety "Wyniki:")
-            displayed_count = 0 # Licznik wyświetlonych obrazów
-
-            # Iterujemy przez maksymalnie 30 znalezionych elementów
-            for item_index, item in enumerate(items[:35]): # Trochę więcej, bo niektóre mogą być pominięte
-                if displayed_count >= 30: # Limit wyświetlanych miniatur
+            self.logger.log(f"Znaleziono {total_count} elementów. Wyświetlam do {self.style.MAX_RESULTS}.")
+            reused_count = 0 # Licznik kafelków zachowanych z poprzedniego wyszukiwania
+
+            # Miniatury zbieramy partiami i grupujemy niemal identyczne obrazy (dHash),
+            # aż grup wystarczy do zapełnienia siatki - duplikaty zwalniają miejsca dla innych zdjęć
+            pending = iter(enumerate(items[:self.style.MAX_CANDIDATES]))
+            seen_ids = set() # Ten sam element może wystąpić w wynikach pod kilkoma linkami
+            candidates, groups = [], []
+            while len(groups) < self.style.MAX_RESULTS:
+                batch = self._collect_candidates(pending, self.style.MAX_RESULTS - len(groups), previous_tiles, seen_ids)
+                if not batch:
                     break
-
-                links = item.get("links", [])
-                data_info_list = item.get("data", [])
-
-                title = "Bez tytułu"
-                if data_info_list:
-                    title = data_info_list[0].get("title", "Bez tytułu")
-
-                img_url = ""
-                # Szukamy linku do obrazu (href), który jest typu 'image'
-                if links:
-                    for link_info in links:
-                        if link_info.get("render") == "image" and link_info.get("href"):
-                            img_url = link_info.get("href")
-                            break # Znaleziono pierwszy link do obrazu
-                    if not img_url and links[0].get("href","").lower().endswith(('.png', '.jpg', '.jpeg', '.gif')): # Zapasowy, jeśli nie ma 'render'
-                        img_url = links[0].get("href")
-
-
-                if img_url:
-                    try:
-                        # Pobieranie danych obrazu z URL
-                        response = requests.get(img_url, timeout=10) # Timeout dla żądania
-                        response.raise_for_status() # Rzuci wyjątkiem dla złych statusów HTTP
-                        img_data = response.content
-
-                        img = Image.open(BytesIO(img_data))
-                        img.thumbnail(self.style.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-                        img_tk = ImageTk.PhotoImage(img)
-                        self.image_references.append(img_tk) # Zapisz referencję!
-
-                        # Kontener dla obrazka i tytułu, aby były razem i miały tło
-                        item_frame = self._create_styled_frame(self.scrollable_frame)
-                        item_frame.grid(row=row, column=col, padx=self.style.PAD_X, pady=self.style.PAD_Y, sticky="n")
-
-                        panel = tk.Label(item_frame, image=img_tk, bg=self.style.BG_COLOR, cursor="hand2")
-                        panel.image = img_tk # Już zapisane w self.image_references, ale dla pewności
-                        panel.pack()
-
-                        title_label = self._create_styled_label(
-                            item_frame,
-                            text=title,
-                            font=(self.style.FONT_FAMILY, 10), # Mniejsza czcionka dla tytułu
-                            wraplength=self.style.THUMBNAIL_SIZE[0] - 10 # Zawijanie tekstu
-                        )
-                        title_label.pack(pady=(2,0))
-
-                        # Pobranie oryginalnego URL obrazu o lepszej jakości, jeśli dostępny
-                        # NASA API często dostarcza link do pliku JSON z metadanymi, skąd można wziąć 'orig'
-                        # Dla uproszczenia, używamy img_url, który jest już miniaturą lub obrazem z 'links'
-                        # W bardziej zaawansowanej wersji, można by tu pobrać `collection.json` i szukać linku "orig"
-                        original_img_url = img_url # Domyślnie ten sam, co miniatura
-
-                        panel.bind("<Button-1>", lambda e, url=original_img_url, t=title: self.show_full_image(url, t))
-                        panel.bind("<Button-3>", lambda e, url=original_img_url, t=title: self.save_image_prompt(url, t))
-                        panel.bind("<Button-2>", lambda e, url=original_img_url, t=title: self.save_image_prompt(url, t)) # Dla macOS
-
-                        col += 1
-                        displayed_count += 1
-                        if col >= self.style.COLUMNS:
-                            col = 0
-                            row += 1 # Tylko jeden wiersz na item_frame
-
-                    except requests.exceptions.Timeout:
-                        self.logger.log(f"Timeout podczas ładowania miniatury: {img_url}")
-                    except requests.exceptions.RequestException as e:
-                        self.logger.log(f"Błąd sieciowy (miniatura) {img_url}: {e}")
-                    except UnidentifiedImageError:
-                        self.logger.log(f"Nie można zidentyfikować formatu obrazu (miniatura): {img_url}")
-                    except Exception as e:
-                        self.logger.log(f"Błąd ładowania miniatury {img_url}: {type(e).__name__} - {e}")
+                self._ensure_hashes(batch)
+                candidates.extend(batch)
+                groups = group_near_duplicates([c['thumb']['dhash'] for c in candidates], self.style.DUPLICATE_MAX_DISTANCE)
+
+            for group in groups:
+                candidate = candidates[group[0]] # Reprezentant grupy - pierwszy w kolejności wyników
+                nasa_id = candidate['item']['nasa_id']
+                if nasa_id in previous_tiles:
+                    # Kafelek (widgety i PhotoImage) już istnieje - przenosimy go bez żadnej pracy nad miniaturą
+                    tile = previous_tiles.pop(nasa_id)
+                    tile.item = candidate['item'] # Np. z 'pack_index', którego nie miał kafelek z sesji lub innej paczki
+                    if tile.source is None:
+                        tile.source = candidate['thumb']['image'] # Kafelek z sesji - źródło mogło zostać właśnie wczytane
+                    self._render_tile(tile) # Bez pracy, jeśli obraz ma już bieżący rozmiar
+                    reused_count += 1
                 else:
-                    self.logger.log(f"Brak URL obrazu w elemencie {item_index} dla '{title}'.")
+                    tile = self._create_tile(candidate['item'], candidate['thumb']['image'], candidate['thumb']['dhash'])
+                self._set_duplicate_count(tile, len(group))
+                self.tiles[nasa_id] = tile
+            displayed_count = len(self.tiles)
+
+            if len(candidates) > len(groups):
+                self.logger.log(f"Zgrupowano {len(candidates) - len(groups)} niemal identycznych obrazów.")
+            self.logger.log(f"Kafelki: zachowano {reused_count}, dodano {displayed_count - reused_count}, "
+                            f"usunięto {len(previous_tiles)}.")
 
             if displayed_count == 0 and items: # Jeśli były itemy, ale żaden się nie załadował
                 self.logger.log("Nie udało się załadować żadnej miniatury z dostępnych danych.")
-                no_valid_images_label = self._create_styled_label(self.scrollable_frame, text="Brak poprawnych obrazów do wyświetlenia.")
-                no_valid_images_label.grid(row=1, column=0, columnspan=self.style.COLUMNS, pady=self.style.PAD_Y)
+                self._show_status("Brak poprawnych obrazów do wyświetlenia.")
 
         except requests.exceptions.Timeout:
             self.logger.log(f"Timeout podczas połączenia z API NASA.")
@@ -404,6 +1541,11 @@ class NASAImageViewer:
             self.logger.log(f"Nieoczekiwany błąd podczas wyszukiwania: {type(e).__name__} - {e}")
             messagebox.showerror("Błąd krytyczny", f"Wystąpił nieoczekiwany błąd: {e}", parent=self.root)
         finally:
+            if previous_tiles is not None:
+                # Usuwamy tylko kafelki, których nie ma w nowych wynikach
+                for tile in previous_tiles.values():
+                    tile.frame.destroy()
+            self._layout_tiles() # Rozmieszczenie kafelków zgodnie z bieżącą szerokością Canvas
             # Po zakończeniu wyszukiwania, zaktualizuj scrollregion, aby był poprawny nawet przy małej liczbie wyników
             self.scrollable_frame.update_idletasks() # Upewnij się, że wszystkie zmiany w GUI zostały przetworzone
             self._on_scrollable_frame_configure(None) # Przekazujemy None, bo event nie jest tu potrzebny
@@ -422,28 +1564,71 @@ class NASAImageViewer:
         Raises:
             requests.exceptions.RequestException: Jeśli wystąpi błąd podczas żądania HTTP (w tym timeout).
         """
-        url = "https://images-api.nasa.gov/search"
-        params = {'q': query, 'media_type': 'image'}
-        self.logger.log(f"Wysyłanie żądania do API: {url} z parametrami: {params}")
-        # Dodano timeout do żądania, aby aplikacja nie zawieszała się na zbyt długo
-        response = requests.get(url, params=params, timeout=15) # 15 sekund timeout
-        response.raise_for_status()  # Rzuci wyjątkiem dla kodów błędów HTTP (4xx lub 5xx)
-        self.logger.log(f"Otrzymano odpowiedź od API, status: {response.status_code}")
-        return response.json()
+        return fetch_nasa_images(query, log=self.logger.log)
 
-    def _load_image_from_url(self, img_url, title_for_log=""):
+    def _load_thumbnail(self, item):
+        """
+        Zwraca miniaturę elementu: z pamięci podręcznej, z paczki offline (w trybie offline
+        wyłącznie z niej), a w przeciwnym razie z sieci.
+
+        Args:
+            item (dict): Element z kluczami 'nasa_id' i 'img_url' (oraz 'pack_index' dla elementów paczki).
+
+        Returns:
+            dict: Wpis pamięci podręcznej {'image': miniatura nie większa niż SOURCE_SIZE,
+            'dhash': skrót percepcyjny lub None, jeśli jeszcze nie policzony}.
+
+        Raises:
+            ValueError: Jeśli otwarta jest paczka offline, a elementu w niej nie ma.
+        """
+        nasa_id = item['nasa_id']
+        if nasa_id in self.thumbnail_cache:
+            thumb = self.thumbnail_cache.pop(nasa_id)
+            self.thumbnail_cache[nasa_id] = thumb # Przesunięcie na koniec - ostatnio użyta
+            return thumb
+
+        if self.mission_pack is not None:
+            if 'pack_index' not in item:
+                raise ValueError(f"element {nasa_id} nie pochodzi z otwartej paczki offline")
+            img = self.mission_pack.open_thumbnail(item['pack_index'])
+            img.thumbnail(self.style.SOURCE_SIZE, Image.Resampling.LANCZOS) # Paczka mogła mieć inny rozmiar
+        else:
+            img = download_thumbnail(item['img_url'], self.style.SOURCE_SIZE)
+
+        # Paczki offline mają skróty policzone podczas budowania
+        thumb = {'image': img, 'dhash': item.get('dhash')}
+        self.thumbnail_cache[nasa_id] = thumb
+        while len(self.thumbnail_cache) > self.style.THUMBNAIL_CACHE_SIZE:
+            del self.thumbnail_cache[next(iter(self.thumbnail_cache))] # Usuń najdawniej użytą miniaturę
+        return thumb
+
+    def _load_image_from_url(self, img_url, title_for_log="", pack_index=None):
         """
         Pobiera i otwiera obraz z podanego URL. Prywatna metoda pomocnicza.
 
+        W trybie paczki offline obraz nie jest pobierany z sieci - zwracana jest miniatura z paczki.
+
         Args:
             img_url (str): URL obrazu.
             title_for_log (str, optional): Tytuł obrazu używany w logach dla lepszej identyfikacji.
+            pack_index (int, optional): Indeks elementu w otwartej paczce offline.
 
         Returns:
             PIL.Image.Image or None: Obiekt obrazu PIL lub None w przypadku błędu.
         """
+        load_heavy_modules() # Pobieranie i dekodowanie wymaga requests i Pillow
+        log_identifier = title_for_log if title_for_log else img_url.split('/')[-1]
+        if self.mission_pack is not None:
+            if pack_index is None:
+                self.logger.log(f"Obraz '{log_identifier}' nie pochodzi z otwartej paczki - niedostępny offline.")
+                messagebox.showinfo("Tryb offline", "Ten obraz nie jest dostępny w otwartej paczce offline.", parent=self.root)
+                return None
+            self.logger.log(f"Wczytywanie obrazu z paczki offline (miniatura {self.mission_pack.thumbnail_size[0]} px): {log_identifier}")
         try:
-            log_identifier = title_for_log if title_for_log else img_url.split('/')[-1]
+            if self.mission_pack is not None:
+                img = self.mission_pack.open_thumbnail(pack_index)
+                img.load() # Dekodowanie od razu, aby błędy uszkodzonego pliku obsłużyć poniżej
+                return img
             self.logger.log(f"Pobieranie pełnego obrazu: {log_identifier}")
             # Dłuższy timeout dla pobierania pełnych obrazów, które mogą być większe
             response = requests.get(img_url, timeout=30) # 30 sekund timeout
@@ -465,15 +1650,16 @@ class NASAImageViewer:
             messagebox.showerror("Błąd", f"Nie udało się załadować obrazu '{title_for_log}'.", parent=self.root)
         return None # Zwrócenie None w przypadku jakiegokolwiek błędu
 
-    def show_full_image(self, img_url, title=""):
+    def show_full_image(self, img_url, title="", pack_index=None):
         """
         Wyświetla pełnowymiarowy obraz w nowym oknie (Toplevel).
 
         Args:
             img_url (str): URL obrazu do wyświetlenia.
             title (str, optional): Tytuł obrazu, wyświetlany w oknie podglądu.
+            pack_index (int, optional): Indeks elementu w paczce offline (podgląd bez sieci).
         """
-        img = self._load_image_from_url(img_url, title) # Użycie metody pomocniczej do załadowania obrazu
+        img = self._load_image_from_url(img_url, title, pack_index) # Użycie metody pomocniczej do załadowania obrazu
         if img is None: # Jeśli ładowanie obrazu się nie powiodło, zakończ
             return
 
@@ -519,7 +1705,7 @@ class NASAImageViewer:
             self.logger.log(f"Błąd wyświetlania pełnego obrazu '{title}': {type(e).__name__} - {e}")
             messagebox.showerror("Błąd wyświetlania", f"Nie udało się wyświetlić obrazu '{title}'.", parent=self.root)
 
-    def save_image_prompt(self, img_url, title):
+    def save_image_prompt(self, img_url, title, pack_index=None):
         """
         Wyświetla okno dialogowe "Zapisz jako" i inicjuje zapis obrazu,
         jeśli użytkownik wybierze lokalizację.
@@ -527,6 +1713,7 @@ class NASAImageViewer:
         Args:
             img_url (str): URL obrazu do zapisania.
             title (str): Sugerowana nazwa pliku (tytuł obrazu).
+            pack_index (int, optional): Indeks elementu w paczce offline (zapis bez sieci).
         """
         # Sugerowana nazwa pliku, oczyszczona z niebezpiecznych znaków
         # Zamienia spacje na podkreślenia i usuwa inne nie-alfanumeryczne znaki (poza '_', '-')
@@ -544,7 +1731,7 @@ class NASAImageViewer:
 
         # Jeśli użytkownik wybrał nazwę pliku (tzn. nie anulował dialogu)
         if filename:
-            img_to_save = self._load_image_from_url(img_url, title) # Pobierz obraz ponownie (oryginalny)
+            img_to_save = self._load_image_from_url(img_url, title, pack_index) # Pobierz obraz ponownie (oryginalny)
             if img_to_save: # Jeśli obraz został pomyślnie załadowany
                 try:
                     # Zapis obrazu PIL do wybranego pliku
@@ -566,10 +1753,34 @@ if __name__ == "__main__":
     # Ten blok kodu jest wykonywany tylko wtedy, gdy skrypt jest uruchamiany bezpośrednio
     # (a nie importowany jako moduł).
 
+    parser = argparse.ArgumentParser(description="NASA Image Viewer 🌌")
+    parser.add_argument("--pack", metavar="PLIK", help="Uruchom przeglądarkę offline z podanej paczki")
+    parser.add_argument("--build-pack", metavar="PLIK", help="Zbuduj paczkę offline z podanych zapytań i zakończ")
+    parser.add_argument("--dup-distance", type=duplicate_distance_arg, default=None, metavar="N",
+                        help="Próg odległości Hamminga (0-64) dla grupowania niemal identycznych obrazów")
+    parser.add_argument("--pages", type=positive_int_arg, default=1, help="Liczba stron wyników na zapytanie przy budowaniu paczki")
+    parser.add_argument("--thumb-size", type=positive_int_arg, default=Style().THUMBNAIL_SIZE[0], metavar="PX",
+                        help="Rozmiar miniatur zapisywanych w paczce; większe kafelki w trybie offline są niedostępne")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Zmierz czasy importów i budowy okna, wypisz raport i zakończ")
+    parser.add_argument("queries", nargs="*", help="Zapytania do umieszczenia w paczce (dla --build-pack)")
+    args = parser.parse_args()
+
+    if args.build_pack:
+        # Budowanie paczki nie wymaga okna - działa w trybie wsadowym
+        if not args.queries:
+            parser.error("--build-pack wymaga co najmniej jednego zapytania")
+        load_heavy_modules()
+        build_mission_pack(args.queries, args.build_pack, thumbnail_size=(args.thumb_size, args.thumb_size), pages=args.pages)
+        raise SystemExit(0)
+
     # Utworzenie głównego okna aplikacji Tkinter
-    root = tk.Tk()
+    with STARTUP_PROFILE.measure("tk.Tk()"):
+        root = tk.Tk()
     # Utworzenie instancji naszej aplikacji, przekazując główne okno
-    app = NASAImageViewer(root)
+    app = NASAImageViewer(root, pack_path=args.pack, duplicate_distance=args.dup_distance)
+    if args.profile_startup:
+        root.after_idle(app.report_startup_profile)
     # Uruchomienie głównej pętli zdarzeń Tkinter.
     # Ta pętla utrzymuje okno otwarte, nasłuchuje na zdarzenia (np. kliknięcia myszą, naciśnięcia klawiszy)
     # i aktualizuje interfejs użytkownika.